@@ -1,5 +1,8 @@
-import argparse, os, sqlite3
-from typing import Optional
+import argparse, csv, functools, itertools, os, shlex, sys
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple, Type
+
+# (sku, title, artist, year, price, quantity), in INSERT_SQL column order
+ProductRow = Tuple[Optional[str], Optional[str], Optional[str], Optional[int], Optional[float], int]
 
 """
 Simple CLI tool to manage an artwork product inventory using SQLite.
@@ -7,18 +10,32 @@ Simple CLI tool to manage an artwork product inventory using SQLite.
 Commands:
     init                Create DB and table (runs automatically on other commands).
     add                 Add a product.
+    add-bulk            Add many products from a CSV file in one transaction.
     remove              Remove a product by id or sku.
     update-qty          Update product quantity (set or delta) by id or sku.
     list                List products (optionally filter by sku).
     get                 Show one product by id or sku.
+    shell               Run commands read from stdin over a single connection.
+    batch               Run commands read from stdin in a single transaction.
+    maintain            Refresh planner statistics and optionally reclaim free pages.
 
 Example:
     python artwork_inventory.py add --title "Sunset" --artist "A. Painter" --year 2020 --price 150.0 --quantity 3 --sku SUN-001
+    python artwork_inventory.py add-bulk --file rows.csv
     python artwork_inventory.py update-qty --sku SUN-001 --delta -1
     python artwork_inventory.py list
+    printf 'update-qty --sku SUN-001 --delta -1\nremove --sku OLD-7\n' | python artwork_inventory.py batch
+    python artwork_inventory.py --in-memory add-bulk --file rows.csv
+    python artwork_inventory.py maintain --incremental 0    (e.g. from cron, or after a large add-bulk)
+    ARTWORK_INVENTORY_DRIVER=apsw python artwork_inventory.py list    (needs `pip install apsw`)
 """
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "artwork_inventory.db")
+# size of sqlite3's per-connection prepared statement cache (stdlib default is 128)
+CACHED_STATEMENTS = 256
+MEMORY_URI = "file::memory:?cache=shared"
+# stored in PRAGMA user_version once TABLE_SQL has been applied
+SCHEMA_VERSION = 1
 TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS artwork (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -29,150 +46,639 @@ CREATE TABLE IF NOT EXISTS artwork (
         price REAL,
         quantity INTEGER NOT NULL DEFAULT 0
 );
+CREATE INDEX IF NOT EXISTS idx_artwork_artist ON artwork(artist);
+CREATE INDEX IF NOT EXISTS idx_artwork_year ON artwork(year);
 """
 
-def get_conn(path: str = DB_PATH):
-        conn = sqlite3.connect(path)
-        conn.row_factory = sqlite3.Row
+# per-connection tuning; WAL is set separately since it can fail (e.g. network filesystems)
+CONN_PRAGMAS = (
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA mmap_size=268435456",
+)
+
+# set to "apsw" to run on the apsw driver; the stdlib sqlite3 module is the default
+DRIVER_ENV = "ARTWORK_INVENTORY_DRIVER"
+
+class DB:
+        """Connection adapter over the stdlib sqlite3 driver; APSWDB provides the same calls on apsw."""
+
+        def __init__(self, conn: Any, driver: Any) -> None:
+                self.conn = conn
+                self.Error: Type[Exception] = driver.Error
+                self.IntegrityError: Type[Exception] = driver.IntegrityError
+                self.sqlite_version_info: Tuple[int, ...] = driver.sqlite_version_info
+                self._init_sku_cache()
+
+        def _init_sku_cache(self) -> None:
+                # per-connection sku -> id cache used by _sku_to_id; it goes away with the connection
+                self.sku_ids: "functools._lru_cache_wrapper[int]" = functools.lru_cache(maxsize=1024)(
+                        functools.partial(_lookup_sku_id, self))
+                # PRAGMA data_version as of the last lookup; it moves when another connection commits
+                self.data_version: Optional[int] = None
+                # only long-lived sessions (shell, batch) turn the cache on; see _sku_to_id
+                self.sku_cache_enabled = False
+
+        def execute(self, sql: str, params: Sequence[Any] = ()) -> Any:
+                return self.conn.execute(sql, params)
+
+        def executemany(self, sql: str, seq: Iterable[Sequence[Any]]) -> None:
+                self.conn.executemany(sql, seq)
+
+        def executescript(self, sql: str) -> None:
+                self.conn.executescript(sql)
+
+        def commit(self) -> None:
+                self.conn.commit()
+
+        def rollback(self) -> None:
+                self.conn.rollback()
+
+        def backup(self, target: "DB") -> None:
+                self.conn.backup(target.conn)
+
+        def create_function(self, name: str, func: Callable[[Any], Any]) -> None:
+                self.conn.create_function(name, 1, func, deterministic=True)
+
+        def total_changes(self) -> int:
+                return int(self.conn.total_changes)
+
+        def close(self) -> None:
+                self.sku_ids.cache_clear()
+                self.conn.close()
+
+class _APSWCursor:
+        """The parts of the sqlite3 cursor API this module uses, on top of an apsw cursor."""
+
+        def __init__(self, conn: Any, cur: Any, complete_error: Type[Exception]) -> None:
+                self._cur = cur
+                self._complete_error = complete_error
+                # apsw runs DML to completion inside execute(), so these are already final
+                self.rowcount: int = conn.changes()
+                self.lastrowid: int = conn.last_insert_rowid()
+
+        @property
+        def description(self) -> Any:
+                try:
+                        return self._cur.getdescription()
+                except self._complete_error:
+                        # statement already finished without producing rows
+                        return ()
+
+        def __iter__(self) -> Iterator[Any]:
+                return iter(self._cur)
+
+        def fetchone(self) -> Any:
+                row = next(iter(self._cur), None)
+                # reset the statement so an autocommit write (e.g. RETURNING) is committed right away
+                self._cur.close()
+                return row
+
+        def fetchall(self) -> List[Any]:
+                return list(self._cur)
+
+class APSWDB(DB):
+        """DB on apsw: statements are prepared once and reused from apsw's statement cache."""
+
+        def __init__(self, conn: Any, driver: Any) -> None:
+                self.conn = conn
+                self.driver = driver
+                self.Error = driver.Error
+                self.IntegrityError = driver.ConstraintError
+                self.sqlite_version_info = tuple(int(n) for n in driver.sqlitelibversion().split("."))
+                self._init_sku_cache()
+
+        def execute(self, sql: str, params: Sequence[Any] = ()) -> Any:
+                cur = self.conn.cursor()
+                cur.execute(sql, params)
+                return _APSWCursor(self.conn, cur, self.driver.ExecutionCompleteError)
+
+        def executemany(self, sql: str, seq: Iterable[Sequence[Any]]) -> None:
+                self.conn.cursor().executemany(sql, seq)
+
+        def executescript(self, sql: str) -> None:
+                # apsw runs every statement in the string from a single execute()
+                for _ in self.conn.cursor().execute(sql):
+                        pass
+
+        def commit(self) -> None:
+                # apsw has no implicit transactions; only explicit BEGINs need closing
+                if not self.conn.getautocommit():
+                        self.conn.execute("COMMIT")
+
+        def rollback(self) -> None:
+                if not self.conn.getautocommit():
+                        self.conn.execute("ROLLBACK")
+
+        def backup(self, target: DB) -> None:
+                with target.conn.backup("main", self.conn, "main") as b:
+                        b.step()
+
+        def create_function(self, name: str, func: Callable[[Any], Any]) -> None:
+                self.conn.create_scalar_function(name, func, 1, deterministic=True)
+
+        def total_changes(self) -> int:
+                return int(self.conn.total_changes())
+
+def _connect(path: str, uri: bool = False) -> DB:
+        # drivers are imported here so `help` and argument errors never load an sqlite extension
+        if os.environ.get(DRIVER_ENV, "sqlite3") == "apsw":
+                import apsw
+                flags = apsw.SQLITE_OPEN_READWRITE | apsw.SQLITE_OPEN_CREATE
+                if uri:
+                        flags |= apsw.SQLITE_OPEN_URI
+                return APSWDB(apsw.Connection(path, flags=flags, statementcachesize=CACHED_STATEMENTS), apsw)
+        import sqlite3
+        return DB(sqlite3.connect(path, uri=uri, cached_statements=CACHED_STATEMENTS), sqlite3)
+
+def get_conn(path: str = DB_PATH, in_memory: bool = False) -> DB:
+        if in_memory:
+                # work on a shared in-memory copy of the database file; persist it with save_conn
+                conn = _connect(MEMORY_URI, uri=True)
+                if os.path.exists(path):
+                        disk = _connect(path)
+                        disk.backup(conn)
+                        disk.close()
+        else:
+                conn = _connect(path)
+        # only takes effect on a brand-new file, so it must precede the WAL switch that writes the header;
+        # existing databases are converted by `maintain --vacuum`
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        try:
+                conn.execute("PRAGMA journal_mode=WAL")
+        except conn.Error:
+                # keep the default rollback journal where WAL is unsupported
+                pass
+        for pragma in CONN_PRAGMAS:
+                conn.execute(pragma)
+        # LIST_SQL uses these where SQLite's own formatting differs from the original f-string:
+        # py_repr for titles plain single quotes cannot reproduce, py_str for prices
+        conn.create_function("py_repr", repr)
+        conn.create_function("py_str", str)
         return conn
 
-def init_db(conn):
-        conn.execute(TABLE_SQL)
+def save_conn(conn: DB, path: str = DB_PATH) -> None:
+        # copy an in-memory database to disk in one backup pass
         conn.commit()
+        disk = _connect(path)
+        conn.backup(disk)
+        disk.close()
+
+def init_db(conn: DB) -> None:
+        # user_version is stamped after the DDL runs, so an initialized database only costs this one PRAGMA
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                # TABLE_SQL holds several statements (table + indexes)
+                conn.executescript(TABLE_SQL + f"PRAGMA user_version = {SCHEMA_VERSION};")
 
-def add_product(conn, title: str, artist: Optional[str], year: Optional[int],
-                                price: Optional[float], quantity: int, sku: Optional[str]):
-        sql = "INSERT INTO artwork (sku, title, artist, year, price, quantity) VALUES (?, ?, ?, ?, ?, ?)"
+def _stdout_bytes() -> Tuple[Optional[BinaryIO], str, str]:
+        """Return stdout's binary buffer plus the encoding and error handler to encode lines with."""
+        out = sys.stdout
+        return getattr(out, "buffer", None), out.encoding or "utf-8", out.errors or "strict"
+
+def _write(text: str) -> None:
+        # all command output goes through here as pre-encoded bytes, skipping print()'s TextIOWrapper
+        # work; with nothing ever pending in the text layer, the buffer is only flushed when full
+        buf, encoding, errors = _stdout_bytes()
+        if buf is None:
+                sys.stdout.write(text)
+        else:
+                buf.write(text.encode(encoding, errors))
+
+def _write_line(text: str) -> None:
+        _write(text + "\n")
+
+def _lookup_sku_id(conn: DB, sku: str) -> int:
+        row = conn.execute("SELECT id FROM artwork WHERE sku = ?", (sku,)).fetchone()
+        if row is None:
+                # raising keeps misses out of the cache, so a later add is seen immediately
+                raise KeyError(sku)
+        return int(row[0])
+
+def _sku_to_id(conn: DB, sku: str) -> int:
+        if not conn.sku_cache_enabled:
+                # a one-shot command resolves its sku once, so the cache and its data_version
+                # check would only add a statement to the plain lookup
+                return _lookup_sku_id(conn, sku)
+        # this connection's writes clear the cache directly; commits from other processes
+        # (e.g. while a shell session is open) show up as a new data_version
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != conn.data_version:
+                conn.sku_ids.cache_clear()
+                conn.data_version = version
+        return conn.sku_ids(sku)
+
+def _resolve_id(conn: DB, id_: Optional[int], sku: Optional[str]) -> Optional[int]:
+        if id_ is not None or sku is None:
+                return id_
         try:
-                cur = conn.execute(sql, (sku, title, artist, year, price, quantity))
-                conn.commit()
-                print(f"Added product id={cur.lastrowid} title={title!r}")
-        except sqlite3.IntegrityError as e:
-                print("Error adding product:", e)
+                return _sku_to_id(conn, sku)
+        except KeyError:
+                return None
+
+INSERT_PREFIX = "INSERT INTO artwork (sku, title, artist, year, price, quantity) VALUES "
+INSERT_SQL = INSERT_PREFIX + "(?, ?, ?, ?, ?, ?)"
+# rows per multi-row INSERT; 6 parameters each stays under the 999-variable limit of pre-3.32 SQLite builds
+MULTI_INSERT_ROWS = 999 // 6
+MULTI_INSERT_SQL = INSERT_PREFIX + ", ".join(["(?, ?, ?, ?, ?, ?)"] * MULTI_INSERT_ROWS)
+# adding an existing sku restocks it; RETURNING hands back the id in the same statement
+UPSERT_SQL = INSERT_SQL + (
+        " ON CONFLICT(sku) DO UPDATE SET quantity = quantity + excluded.quantity RETURNING id, quantity"
+)
+
+def _has_returning(conn: DB) -> bool:
+        # RETURNING needs SQLite 3.35+; older libraries always take the strict insert path
+        return conn.sqlite_version_info >= (3, 35, 0)
+
+def add_product(conn: DB, title: str, artist: Optional[str], year: Optional[int],
+                                price: Optional[float], quantity: int, sku: Optional[str], commit: bool = True,
+                                strict: bool = False) -> None:
+        params = (sku, title, artist, year, price, quantity)
+        try:
+                if strict or not _has_returning(conn):
+                        cur = conn.execute(INSERT_SQL, params)
+                        if commit:
+                                conn.commit()
+                        conn.sku_ids.cache_clear()
+                        _write_line(f"Added product id={cur.lastrowid} title={title!r}")
+                        return
+                row_id, qty = conn.execute(UPSERT_SQL, params).fetchone()
+                if commit:
+                        conn.commit()
+                _write_line(f"Added product id={row_id} title={title!r} qty={qty}")
+        except conn.IntegrityError as e:
+                if not commit:
+                        # inside a caller's transaction (batch): let it roll everything back
+                        raise
+                _write_line(f"Error adding product: {e}")
 
-def remove_product(conn, id_: Optional[int], sku: Optional[str]):
+def _csv_value(value: Optional[str]) -> Optional[str]:
+        # empty CSV cells map to NULL, like omitted CLI flags
+        if value is None or value.strip() == "":
+                return None
+        return value
+
+def read_bulk_rows(f: TextIO) -> Iterator[ProductRow]:
+        """Yield (sku, title, artist, year, price, quantity) tuples from a CSV with a header row."""
+        for rec in csv.DictReader(f):
+                year = _csv_value(rec.get("year"))
+                price = _csv_value(rec.get("price"))
+                quantity = _csv_value(rec.get("quantity"))
+                yield (_csv_value(rec.get("sku")), rec.get("title"), _csv_value(rec.get("artist")),
+                       None if year is None else int(year), None if price is None else float(price),
+                       0 if quantity is None else int(quantity))
+
+def _insert_groups(conn: DB, chunk: List[ProductRow]) -> int:
+        # rows go through the multi-row statement in whole groups, one VDBE program per
+        # MULTI_INSERT_ROWS rows; returns how many leading rows of `chunk` were inserted
+        full = len(chunk) - len(chunk) % MULTI_INSERT_ROWS
+        if full:
+                conn.executemany(MULTI_INSERT_SQL, [
+                        list(itertools.chain.from_iterable(chunk[i:i + MULTI_INSERT_ROWS]))
+                        for i in range(0, full, MULTI_INSERT_ROWS)
+                ])
+        return full
+
+def add_products_bulk(conn: DB, rows: Iterable[ProductRow], batch_size: int = 10000) -> None:
+        # one explicit transaction for the whole load: a single fsync instead of one per row
+        total = 0
+        chunk: List[ProductRow] = []
+        try:
+                conn.execute("BEGIN")
+                for row in rows:
+                        chunk.append(row)
+                        if len(chunk) >= batch_size:
+                                # a partial group carries over into the next chunk, so even a small
+                                # --batch-size still fills multi-row statements
+                                done = _insert_groups(conn, chunk)
+                                total += done
+                                del chunk[:done]
+                done = _insert_groups(conn, chunk)
+                total += done
+                # only the final tail that does not fill a group uses the single-row statement
+                if chunk[done:]:
+                        conn.executemany(INSERT_SQL, chunk[done:])
+                        total += len(chunk) - done
+                conn.execute("COMMIT")
+                conn.sku_ids.cache_clear()
+        except (conn.IntegrityError, ValueError) as e:
+                conn.execute("ROLLBACK")
+                _write_line(f"Error adding products, nothing was added: {e}")
+                return
+        _write_line(f"Added {total} product(s).")
+
+def remove_product(conn: DB, id_: Optional[int], sku: Optional[str], commit: bool = True) -> None:
         if id_ is None and sku is None:
-                print("Provide --id or --sku to remove a product.")
+                _write_line("Provide --id or --sku to remove a product.")
                 return
-        if id_ is not None:
-                cur = conn.execute("DELETE FROM artwork WHERE id = ?", (id_,))
-        else:
-                cur = conn.execute("DELETE FROM artwork WHERE sku = ?", (sku,))
-        conn.commit()
+        cur = conn.execute("DELETE FROM artwork WHERE id = ?", (_resolve_id(conn, id_, sku),))
+        if commit:
+                conn.commit()
+        conn.sku_ids.cache_clear()
         if cur.rowcount:
-                print("Removed", cur.rowcount, "row(s).")
+                _write_line(f"Removed {cur.rowcount} row(s).")
         else:
-                print("No matching product found.")
+                _write_line("No matching product found.")
 
-def update_quantity(conn, id_: Optional[int], sku: Optional[str], set_qty: Optional[int], delta: Optional[int]):
+UPDATE_QTY_SQL = "UPDATE artwork SET quantity = COALESCE(?, quantity + ?) WHERE id = ?"
+
+def update_quantity(conn: DB, id_: Optional[int], sku: Optional[str], set_qty: Optional[int], delta: Optional[int],
+                    commit: bool = True) -> None:
         if id_ is None and sku is None:
-                print("Provide --id or --sku to identify a product.")
+                _write_line("Provide --id or --sku to identify a product.")
                 return
         if set_qty is None and delta is None:
-                print("Provide --set or --delta to change quantity.")
+                _write_line("Provide --set or --delta to change quantity.")
                 return
 
-        if set_qty is not None:
-                if id_ is not None:
-                        cur = conn.execute("UPDATE artwork SET quantity = ? WHERE id = ?", (set_qty, id_))
-                else:
-                        cur = conn.execute("UPDATE artwork SET quantity = ? WHERE sku = ?", (set_qty, sku))
-        else:
-                # delta provided
-                if id_ is not None:
-                        cur = conn.execute("UPDATE artwork SET quantity = quantity + ? WHERE id = ?", (delta, id_))
-                else:
-                        cur = conn.execute("UPDATE artwork SET quantity = quantity + ? WHERE sku = ?", (delta, sku))
-        conn.commit()
+        # one statement for set and delta: a NULL set falls back to quantity + delta
+        cur = conn.execute(UPDATE_QTY_SQL, (set_qty, delta or 0, _resolve_id(conn, id_, sku)))
+        if commit:
+                conn.commit()
         if cur.rowcount:
-                print("Updated quantity for", cur.rowcount, "row(s).")
+                _write_line(f"Updated quantity for {cur.rowcount} row(s).")
         else:
-                print("No matching product found.")
+                _write_line("No matching product found.")
+
+# format list lines (newline included) inside SQLite so rows never become Python Row objects.
+# Titles print exactly as repr() would: printable ASCII without quotes or backslashes is wrapped
+# in single quotes in SQL, anything else (control characters, quotes, non-ASCII) goes to py_repr.
+# Prices go through py_str: printf's float formatting drops digits and varies between SQLite builds,
+# and str(None) gives the 'None' shown for a missing price.
+LIST_SQL = r"""
+SELECT id, printf('id=%d sku=%s title=%s artist=%s year=%s price=%s qty=%d',
+                  id, COALESCE(sku, 'None'),
+                  CASE WHEN title GLOB '*[^ -~]*' OR instr(title, '''') OR instr(title, '\')
+                       THEN py_repr(title) ELSE '''' || title || '''' END,
+                  COALESCE(artist, 'None'), COALESCE(year, 'None'), py_str(price),
+                  quantity) || char(10)
+FROM artwork
+"""
 
-def list_products(conn, sku: Optional[str]):
+def _list_pages(conn: DB, sku: Optional[str],
+               page_size: Optional[int]) -> Iterator[Iterable[Tuple[int, str]]]:
         if sku:
-                cur = conn.execute("SELECT * FROM artwork WHERE sku = ? ORDER BY id", (sku,))
+                yield conn.execute(LIST_SQL + "WHERE sku = ? ORDER BY id", (sku,))
+        elif not page_size:
+                yield conn.execute(LIST_SQL + "ORDER BY id")
         else:
-                cur = conn.execute("SELECT * FROM artwork ORDER BY id")
-        rows = cur.fetchall()
-        if not rows:
-                print("No products found.")
-                return
-        for r in rows:
-                print(f"id={r['id']} sku={r['sku']!s} title={r['title']!r} artist={r['artist']!s} year={r['year']!s} price={r['price']!s} qty={r['quantity']}")
-
-def get_product(conn, id_: Optional[int], sku: Optional[str]):
-        if id_ is not None:
-                cur = conn.execute("SELECT * FROM artwork WHERE id = ?", (id_,))
-        elif sku is not None:
-                cur = conn.execute("SELECT * FROM artwork WHERE sku = ?", (sku,))
-        else:
-                print("Provide --id or --sku to get a product.")
+                # keyset pagination: each page is a rowid range scan starting after the last id seen
+                last = 0
+                while True:
+                        page = conn.execute(LIST_SQL + "WHERE id > ? ORDER BY id LIMIT ?", (last, page_size)).fetchall()
+                        if not page:
+                                return
+                        yield page
+                        if len(page) < page_size:
+                                return
+                        last = page[-1][0]
+
+def list_products(conn: DB, sku: Optional[str], page_size: Optional[int] = None) -> None:
+        buf, encoding, errors = _stdout_bytes()
+        found = False
+        for page in _list_pages(conn, sku, page_size):
+                if buf is None:
+                        for _, line in page:
+                                found = True
+                                sys.stdout.write(line)
+                        continue
+                for _, line in page:
+                        found = True
+                        buf.write(line.encode(encoding, errors))
+                buf.flush()
+        if not found:
+                _write_line("No products found.")
+
+def get_product(conn: DB, id_: Optional[int], sku: Optional[str]) -> None:
+        if id_ is None and sku is None:
+                _write_line("Provide --id or --sku to get a product.")
                 return
+        cur = conn.execute("SELECT * FROM artwork WHERE id = ?", (_resolve_id(conn, id_, sku),))
+        # plain tuples instead of sqlite3.Row: column names come from the cursor description
+        names = [d[0] for d in cur.description]
         r = cur.fetchone()
         if not r:
-                print("Product not found.")
+                _write_line("Product not found.")
                 return
-        print(dict(r))
+        _write_line(repr(dict(zip(names, r))))
 
-def main(argv=None):
-        parser = argparse.ArgumentParser(description="Artwork inventory CLI")
-        sub = parser.add_subparsers(dest="cmd")
-        # keep a mapping of subcommand name -> parser so we can show per-command help
-        sub_parsers = {}
-
-        sub_parsers['init'] = sub.add_parser("init", help="Create DB and table")
-
-        p_add = sub.add_parser("add", help="Add a product")
-        sub_parsers['add'] = p_add
-        p_add.add_argument("--title", required=True)
-        p_add.add_argument("--artist")
-        p_add.add_argument("--year", type=int)
-        p_add.add_argument("--price", type=float)
-        p_add.add_argument("--quantity", type=int, default=0)
-        p_add.add_argument("--sku")
-
-        p_remove = sub.add_parser("remove", help="Remove a product by id or sku")
-        sub_parsers['remove'] = p_remove
-        p_remove.add_argument("--id", type=int)
-        p_remove.add_argument("--sku")
-
-        p_update = sub.add_parser("update-qty", help="Update product quantity (set or delta)")
-        sub_parsers['update-qty'] = p_update
-        p_update.add_argument("--id", type=int)
-        p_update.add_argument("--sku")
-        group = p_update.add_mutually_exclusive_group(required=True)
+def maintain_db(conn: DB, vacuum: bool = False, incremental: Optional[int] = None) -> None:
+        # fresh statistics let the planner keep choosing the sku index as the table churns
+        conn.execute("ANALYZE artwork")
+        if incremental is not None:
+                # incremental_vacuum frees one page per step; stdlib execute() steps a row-less
+                # statement only once, while executescript() runs it to completion
+                conn.executescript(f"PRAGMA incremental_vacuum({incremental});")
+        if vacuum:
+                conn.commit()
+                # a full VACUUM also switches databases created before auto_vacuum=INCREMENTAL over to it
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        _write_line(f"Maintenance done, {free} free page(s) left.")
+
+def _positive_int(value: str) -> int:
+        try:
+                n = int(value)
+        except ValueError:
+                n = 0
+        if n <= 0:
+                raise argparse.ArgumentTypeError(f"expected a positive integer, got {value!r}")
+        return n
+
+def _build_add_parser(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--title", required=True)
+        p.add_argument("--artist")
+        p.add_argument("--year", type=int)
+        p.add_argument("--price", type=float)
+        p.add_argument("--quantity", type=int, default=0)
+        p.add_argument("--sku")
+        p.add_argument("--strict", action="store_true",
+                       help="Fail on an existing sku instead of adding --quantity to its stock")
+
+def _build_add_bulk_parser(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--file", required=True, help="CSV with header: sku,title,artist,year,price,quantity")
+        p.add_argument("--batch-size", type=_positive_int, default=10000,
+                       help=f"Rows read from the CSV per insert round; rows are inserted {MULTI_INSERT_ROWS} per "
+                            "statement, and a partial group waits for the next round")
+
+def _build_remove_parser(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--id", type=int)
+        p.add_argument("--sku")
+
+def _build_update_parser(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--id", type=int)
+        p.add_argument("--sku")
+        group = p.add_mutually_exclusive_group(required=True)
         group.add_argument("--set", dest="set_qty", type=int, help="Set absolute quantity")
         group.add_argument("--delta", type=int, help="Add/subtract from current quantity")
 
-        p_list = sub.add_parser("list", help="List products")
-        sub_parsers['list'] = p_list
-        p_list.add_argument("--sku")
+def _build_list_parser(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--sku")
+        p.add_argument("--page-size", type=_positive_int, help="Fetch and print rows in pages of this size")
 
-        p_get = sub.add_parser("get", help="Get one product")
-        sub_parsers['get'] = p_get
+def _build_get_parser(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--id", type=int)
+        p.add_argument("--sku")
 
-        args = parser.parse_args(argv)
+def _build_maintain_parser(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--vacuum", action="store_true", help="Rebuild the database file with VACUUM")
+        p.add_argument("--incremental", type=int, metavar="N",
+                       help="Free up to N unused pages with incremental_vacuum (0 frees all)")
 
-        conn = get_conn()
-        init_db(conn)
+# subcommand name -> (help text, function adding its arguments)
+COMMANDS: Dict[str, Tuple[str, Optional[Callable[[argparse.ArgumentParser], None]]]] = {
+        "init": ("Create DB and table", None),
+        "help": ("Show this help", None),
+        "add": ("Add a product", _build_add_parser),
+        "add-bulk": ("Add products from a CSV file in one transaction", _build_add_bulk_parser),
+        "remove": ("Remove a product by id or sku", _build_remove_parser),
+        "update-qty": ("Update product quantity (set or delta)", _build_update_parser),
+        "list": ("List products", _build_list_parser),
+        "get": ("Get one product", _build_get_parser),
+        "shell": ("Read commands from stdin over one open connection", None),
+        "batch": ("Run commands from stdin in a single transaction", None),
+        "maintain": ("Run ANALYZE and optionally reclaim free pages", _build_maintain_parser),
+}
+
+def build_parser(cmd: Optional[str] = None) -> argparse.ArgumentParser:
+        """Build the CLI parser; with `cmd`, only that subcommand's parser is constructed."""
+        parser = argparse.ArgumentParser(description="Artwork inventory CLI")
+        parser.add_argument("--in-memory", action="store_true",
+                            help="Run against an in-memory copy of the database and save it back at exit if it changed")
+        sub = parser.add_subparsers(dest="cmd")
+        for name, (help_text, build) in COMMANDS.items():
+                if cmd is None or name == cmd:
+                        p = sub.add_parser(name, help=help_text)
+                        if build:
+                                build(p)
+        return parser
+
+def parse_args(argv: Sequence[str]) -> argparse.Namespace:
+        # the first non-option token names the command; the only global option (--in-memory) takes no value
+        cmd = next((a for a in argv if not a.startswith("-")), None)
+        if cmd not in COMMANDS:
+                # unknown or missing command: the full parser gives the complete usage message
+                cmd = None
+        return build_parser(cmd).parse_args(argv)
 
+def run_command(conn: DB, args: argparse.Namespace, commit: bool = True) -> None:
         if args.cmd == "init":
-                print("Database initialized.")
-        elif args.cmd == "help":
-                parser.print_help()
+                _write_line("Database initialized.")
         elif args.cmd == "add":
-                add_product(conn, args.title, args.artist, args.year, args.price, args.quantity, args.sku)
+                add_product(conn, args.title, args.artist, args.year, args.price, args.quantity, args.sku,
+                            commit=commit, strict=args.strict)
+        elif args.cmd == "add-bulk":
+                with open(args.file, newline="") as f:
+                        add_products_bulk(conn, read_bulk_rows(f), args.batch_size)
         elif args.cmd == "remove":
-                remove_product(conn, args.id, args.sku)
+                remove_product(conn, args.id, args.sku, commit)
         elif args.cmd == "update-qty":
-                update_quantity(conn, args.id, args.sku, args.set_qty, args.delta)
+                update_quantity(conn, args.id, args.sku, args.set_qty, args.delta, commit)
         elif args.cmd == "list":
-                list_products(conn, args.sku)
+                list_products(conn, args.sku, args.page_size)
         elif args.cmd == "get":
                 get_product(conn, args.id, args.sku)
+        elif args.cmd == "maintain":
+                maintain_db(conn, args.vacuum, args.incremental)
+        elif args.cmd == "shell":
+                run_shell(conn)
+        elif args.cmd == "batch":
+                run_batch(conn)
         else:
-                parser.print_help()
+                build_parser().print_help()
+                # print_help() writes through the text layer; push it out ahead of later byte output
+                sys.stdout.flush()
+
+def run_shell(conn: DB) -> None:
+        # one connection (and its statement cache) serves every command read from stdin,
+        # so repeated sku lookups are worth caching
+        conn.sku_cache_enabled = True
+        interactive = sys.stdin.isatty()
+        while True:
+                if interactive:
+                        _write("> ")
+                        # show the previous command's output and the prompt before blocking on input
+                        sys.stdout.flush()
+                line = sys.stdin.readline()
+                if not line:
+                        break
+                try:
+                        tokens = shlex.split(line)
+                except ValueError as e:
+                        _write_line(f"Error: {e}")
+                        continue
+                if not tokens:
+                        continue
+                if tokens[0] in ("quit", "exit"):
+                        break
+                try:
+                        args = parse_args(tokens)
+                except SystemExit:
+                        # argparse already printed the usage error; keep the session alive
+                        continue
+                if args.cmd in ("shell", "batch"):
+                        continue
+                try:
+                        run_command(conn, args)
+                except (ValueError, OSError, conn.Error) as e:
+                        # drop whatever the failed command left uncommitted; the session carries on
+                        conn.rollback()
+                        _write_line(f"Error: {e}")
+
+# commands that can share the single transaction opened by `batch`
+BATCH_COMMANDS = ("add", "remove", "update-qty", "list", "get")
+
+def _abort_batch(conn: DB) -> None:
+        conn.rollback()
+        # ids cached during the batch may belong to rows that were just rolled back
+        conn.sku_ids.cache_clear()
+        _write_line("Batch aborted, no changes were saved.")
+
+def run_batch(conn: DB) -> None:
+        # every command read from stdin runs in one transaction, so the batch pays for one commit
+        conn.sku_cache_enabled = True
+        count = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+                for line in sys.stdin:
+                        tokens = shlex.split(line)
+                        if not tokens:
+                                continue
+                        args = parse_args(tokens)
+                        if args.cmd not in BATCH_COMMANDS:
+                                build_parser(args.cmd).error(f"{args.cmd} cannot run inside a batch")
+                        run_command(conn, args, commit=False)
+                        count += 1
+        except (ValueError, conn.Error) as e:
+                # bad quoting from shlex.split or a failing statement: report it like argparse errors
+                _write_line(f"Error: {e}")
+                _abort_batch(conn)
+                raise SystemExit(1)
+        except BaseException:
+                _abort_batch(conn)
+                raise
+        conn.commit()
+        _write_line(f"Batch committed {count} command(s).")
+
+# commands that change the database file without changing any rows
+SCHEMA_COMMANDS = ("init", "maintain")
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+        args = parse_args(sys.argv[1:] if argv is None else argv)
+        if args.cmd in (None, "help"):
+                # help needs neither sqlite3 nor the database
+                build_parser().print_help()
+                return
+
+        conn = get_conn(in_memory=args.in_memory)
+        init_db(conn)
+        changes = conn.total_changes()
+        run_command(conn, args)
+        # write the in-memory copy back only if this run changed it: saving replaces the whole file,
+        # which would also drop anything other connections committed in the meantime
+        if args.in_memory and (args.cmd in SCHEMA_COMMANDS or conn.total_changes() != changes):
+                save_conn(conn)
 
 if __name__ == "__main__":
         main()
\ No newline at end of file
@@ -0,0 +1,18 @@
+"""
+Optional build that compiles artwork_inventory.py into a C extension with mypyc.
+
+    pip install mypy
+    python3 setup.py build_ext --inplace
+
+The compiled module is picked up by `import artwork_inventory`; run it with
+`python3 -c "import artwork_inventory; artwork_inventory.main()" list`.
+Delete the generated .so file to go back to the plain script.
+"""
+from setuptools import setup
+from mypyc.build import mypycify
+
+setup(
+        name="artwork-inventory",
+        version="0.1.0",
+        ext_modules=mypycify(["artwork_inventory.py"]),
+)
\ No newline at end of file